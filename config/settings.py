@@ -18,6 +18,15 @@ class Config:
     MAX_FILE_SIZE: int = int(os.getenv("MAX_FILE_SIZE", "2147483648"))  # 2GB
     CHUNK_SIZE: int = int(os.getenv("CHUNK_SIZE", "1048576"))  # 1MB
 
+    # Download Configuration
+    DOWNLOAD_CONCURRENCY: int = int(os.getenv("DOWNLOAD_CONCURRENCY", "16"))  # Parallel segment fetches
+    HTTP_POOL_SIZE: int = int(os.getenv("HTTP_POOL_SIZE", "64"))  # Connections shared by all downloads
+    MEMORY_BUFFER_LIMIT: int = int(os.getenv("MEMORY_BUFFER_LIMIT", "1073741824"))  # 1GB of in-memory segments
+    USE_IO_URING: bool = os.getenv("USE_IO_URING", "false").lower() == "true"  # Needs liburing, Linux only
+
+    # Progress Configuration
+    PROGRESS_INTERVAL: float = float(os.getenv("PROGRESS_INTERVAL", "2"))  # Min seconds between status edits
+
     # Logging Configuration
     LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
 
@@ -1,15 +1,6 @@
 """
 Utility modules for M3U8 Telegram Bot.
-"""
-
-from .downloader import M3U8Downloader
-from .video_processor import VideoProcessor
-from .helpers import parse_url_and_filename, update_progress, format_file_size
 
-__all__ = [
-    'M3U8Downloader',
-    'VideoProcessor', 
-    'parse_url_and_filename',
-    'update_progress',
-    'format_file_size'
-]
+Submodules are imported explicitly (e.g. ``from utils.downloader import
+M3U8Downloader``) so that heavy dependencies load only when needed.
+"""
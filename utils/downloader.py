@@ -3,46 +3,238 @@ M3U8 downloader module for handling playlist downloads.
 """
 
 import os
+import sys
+import time
+import random
+import hashlib
+import email.utils
 import tempfile
+import threading
 import shutil
 import logging
 import asyncio
-from typing import List, Callable, Optional
+from typing import TYPE_CHECKING, AsyncIterator, Dict, List, Optional, Tuple, Union
 import aiohttp
-import aiofiles
-import m3u8
 from pathlib import Path
 
+if TYPE_CHECKING:
+    import m3u8
+
 from config.settings import Config
+from utils.helpers import ProgressCallback, report_progress
+
+try:
+    import liburing
+except ImportError:
+    liburing = None
 
 logger = logging.getLogger(__name__)
 
+# Segments up to this size are buffered in memory and written in one go
+SMALL_SEGMENT_SIZE = 4 * 1024 * 1024  # 4MB
+
+
+def _retry_delay(retry_count: int) -> float:
+    """Exponential backoff with jitter so parallel retries don't stampede."""
+    return (2 ** retry_count) * 0.2 + random.random() * 0.2
+
+
+# Client errors that are worth retrying: request timeout and rate limiting
+RETRYABLE_CLIENT_ERRORS = {408, 429}
+
+# Longest Retry-After wait honoured before retrying a segment
+MAX_RETRY_AFTER = 60.0  # seconds
+
+
+def _retry_after(headers) -> Optional[float]:
+    """
+    Parse a Retry-After header given as seconds or an HTTP date.
+
+    Args:
+        headers: Response headers, or None
+
+    Returns:
+        Seconds to wait (capped at MAX_RETRY_AFTER), or None if absent or invalid
+    """
+    value = headers.get('Retry-After') if headers else None
+    if not value:
+        return None
+    try:
+        delay = float(value)
+    except ValueError:
+        try:
+            delay = email.utils.parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    return min(max(delay, 0.0), MAX_RETRY_AFTER)
+
+
+def _memory_budget() -> int:
+    """Bytes of segment data that may be held in memory at once."""
+    try:
+        available = os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (AttributeError, ValueError, OSError):
+        return 0
+    return min(available // 4, Config.MEMORY_BUFFER_LIMIT)
+
+
+def _write_segment_sync(filepath: str, data: bytes) -> None:
+    """Write a fully buffered segment to disk."""
+    with open(filepath, 'wb') as f:
+        f.write(data)
+
+
+class _UringWriter:
+    """Writes whole segments with batched io_uring submissions (Linux only)."""
+
+    def __init__(self, entries: int = 1024):
+        self.entries = entries
+        self.ring = liburing.io_uring()
+        self.cqe = liburing.io_uring_cqe()
+        liburing.io_uring_queue_init(entries, self.ring, 0)
+        # A ring must not be driven from several threads at once, nor torn
+        # down while a write is using it
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def write(self, filepath: str, chunks: List[bytes]) -> None:
+        """
+        Write buffered chunks to a new file, one SQE per chunk.
+
+        Args:
+            filepath: Local file path to save segment
+            chunks: Segment data in order
+
+        Raises:
+            OSError: If a write fails or is short, or the ring is closed
+        """
+        fd = os.open(filepath, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            with self._lock:
+                if self._closed:
+                    raise OSError(f"io_uring writer is closed: {filepath}")
+                offset = 0
+                written = 0
+                error: Optional[OSError] = None
+                for start in range(0, len(chunks), self.entries):
+                    batch = chunks[start:start + self.entries]
+                    for chunk in batch:
+                        sqe = liburing.io_uring_get_sqe(self.ring)
+                        liburing.io_uring_prep_write(sqe, fd, chunk, len(chunk), offset)
+                        offset += len(chunk)
+                    liburing.io_uring_submit_and_wait(self.ring, len(batch))
+
+                    # Reap every completion so the ring stays usable on error
+                    for _ in batch:
+                        liburing.io_uring_wait_cqe(self.ring, self.cqe)
+                        res = self.cqe.res
+                        liburing.io_uring_cqe_seen(self.ring, self.cqe)
+                        if res < 0:
+                            error = OSError(-res, os.strerror(-res), filepath)
+                        else:
+                            written += res
+                    if error:
+                        raise error
+        finally:
+            os.close(fd)
+
+        if written != offset:
+            raise OSError(f"Short io_uring write to {filepath}: {written}/{offset} bytes")
+
+    def close(self) -> None:
+        """Tear down the ring once any in-flight write has finished."""
+        with self._lock:
+            if not self._closed:
+                self._closed = True
+                liburing.io_uring_queue_exit(self.ring)
+
+
+_shared_session: Optional[aiohttp.ClientSession] = None
+
+# Parsed media playlists keyed by a hash of the requested URL
+PLAYLIST_CACHE_TTL = 30.0  # seconds
+_playlist_cache: Dict[bytes, Tuple[float, "m3u8.M3U8"]] = {}
+
+
+def _playlist_key(url: str) -> bytes:
+    """Short fixed-size cache key for a playlist URL."""
+    return hashlib.blake2b(url.encode(), digest_size=16).digest()
+
+
+def create_session() -> aiohttp.ClientSession:
+    """
+    Create an HTTP session tuned for reuse across downloads.
+
+    Returns:
+        New aiohttp ClientSession
+    """
+    timeout = aiohttp.ClientTimeout(total=Config.DOWNLOAD_TIMEOUT)
+    connector = aiohttp.TCPConnector(
+        limit=Config.HTTP_POOL_SIZE,
+        limit_per_host=Config.DOWNLOAD_CONCURRENCY,
+        keepalive_timeout=75,
+        ttl_dns_cache=600,
+        enable_cleanup_closed=True
+    )
+    return aiohttp.ClientSession(
+        timeout=timeout,
+        connector=connector,
+        read_bufsize=Config.CHUNK_SIZE
+    )
+
+
+def get_shared_session() -> aiohttp.ClientSession:
+    """
+    Get the process-wide HTTP session, creating it on first use.
+
+    Returns:
+        Shared aiohttp ClientSession
+    """
+    global _shared_session
+    if _shared_session is None or _shared_session.closed:
+        _shared_session = create_session()
+    return _shared_session
+
 
 class M3U8Downloader:
     """Handles M3U8 playlist downloading and segment management."""
 
-    def __init__(self):
-        self.session: Optional[aiohttp.ClientSession] = None
+    def __init__(self, session: Optional[aiohttp.ClientSession] = None):
+        # Injected sessions are owned by the caller; otherwise use the shared one
+        self.session: Optional[aiohttp.ClientSession] = session
         self.temp_dir: Optional[str] = None
+        self._uring: Optional[_UringWriter] = None
 
     async def __aenter__(self):
         """Async context manager entry."""
         self.temp_dir = tempfile.mkdtemp()
-        timeout = aiohttp.ClientTimeout(total=Config.DOWNLOAD_TIMEOUT)
-        self.session = aiohttp.ClientSession(timeout=timeout)
+        if self.session is None:
+            self.session = get_shared_session()
+        if Config.USE_IO_URING and sys.platform == 'linux':
+            if liburing is None:
+                logger.warning("USE_IO_URING is set but liburing is not installed")
+            else:
+                try:
+                    self._uring = _UringWriter()
+                except OSError as e:
+                    # e.g. io_uring blocked by a container seccomp profile
+                    logger.warning(f"io_uring unavailable, using regular writes: {e}")
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         """Async context manager exit."""
-        if self.session:
-            await self.session.close()
+        if self._uring:
+            # Cancelled workers may still have a write running in a thread;
+            # close() waits for it without blocking the event loop
+            uring, self._uring = self._uring, None
+            await asyncio.to_thread(uring.close)
         if self.temp_dir and os.path.exists(self.temp_dir):
             shutil.rmtree(self.temp_dir)
 
     async def download_m3u8(
         self, 
         url: str, 
-        progress_callback: Optional[Callable[[str], None]] = None
+        progress_callback: Optional[ProgressCallback] = None
     ) -> List[str]:
         """
         Download M3U8 playlist and all segments.
@@ -58,43 +250,189 @@ class M3U8Downloader:
             ValueError: If no segments found in playlist
             Exception: For download errors
         """
+        downloaded_segments = [
+            filepath async for filepath in self.stream_segments(url, progress_callback)
+        ]
+        logger.info(f"Successfully downloaded {len(downloaded_segments)} segments")
+        return downloaded_segments
+
+    async def stream_segments(
+        self,
+        url: str,
+        progress_callback: Optional[ProgressCallback] = None,
+        in_memory: bool = False
+    ) -> AsyncIterator[Union[str, bytes]]:
+        """
+        Download M3U8 segments in parallel and yield them in playlist order.
+
+        Segments are yielded as soon as they and every earlier segment are
+        available, so a consumer can merge while later segments are still
+        being fetched. At most twice the download concurrency is kept ahead
+        of the consumer, which bounds the disk footprint.
+
+        Args:
+            url: M3U8 playlist URL
+            progress_callback: Optional callback for progress updates
+            in_memory: Yield segment data as bytes instead of writing it to
+                disk, spilling to files only while the buffered total is over
+                the memory budget
+
+        Yields:
+            Downloaded segment file paths, or segment bytes when in memory.
+            For fMP4 playlists the initialization section comes first
+
+        Raises:
+            ValueError: If no segments found in playlist
+            Exception: For download errors
+        """
+        workers: List[asyncio.Task] = []
         try:
-            # Parse M3U8 playlist
-            playlist = m3u8.load(url)
+            # Fetch and parse M3U8 playlist
+            playlist = await self.load_playlist(url)
             if not playlist.segments:
                 raise ValueError("No segments found in M3U8 playlist")
 
             total_segments = len(playlist.segments)
-            downloaded_segments = []
+            pending = iter(enumerate(playlist.segments))
+            finished: asyncio.Queue = asyncio.Queue()
+            window = asyncio.Semaphore(2 * Config.DOWNLOAD_CONCURRENCY)
+            completed = 0
+            memory_budget = _memory_budget() if in_memory else 0
+            buffered_bytes = 0
 
             logger.info(f"Found {total_segments} segments to download")
 
-            for i, segment in enumerate(playlist.segments):
-                segment_url = segment.absolute_uri
-                filename = f"segment_{i:04d}.ts"
-                filepath = os.path.join(self.temp_dir, filename)
+            async def worker() -> None:
+                nonlocal completed, buffered_bytes
+                while True:
+                    # Taking a window slot before the next index keeps
+                    # segments allocated strictly in playlist order
+                    await window.acquire()
+                    try:
+                        i, segment = next(pending)
+                    except StopIteration:
+                        window.release()
+                        return
+
+                    # Any failure, including in the progress callback, must
+                    # reach the consumer or it would wait on this index forever
+                    try:
+                        if buffered_bytes < memory_budget:
+                            filepath = None
+                        else:
+                            filename = f"segment_{i:04d}.ts"
+                            filepath = os.path.join(self.temp_dir, filename)
+                        data = await self._download_segment(segment.absolute_uri, filepath)
+                        if data is not None:
+                            buffered_bytes += len(data)
+
+                        # Single-threaded event loop, so the increment is atomic
+                        completed += 1
+                        if progress_callback:
+                            progress = completed / total_segments * 100
+                            await report_progress(progress_callback, f"Downloaded segment {completed}/{total_segments} ({progress:.1f}%)")
+                    except Exception as e:
+                        await finished.put((i, e))
+                        return
+                    await finished.put((i, filepath if data is None else data))
 
-                await self._download_segment(segment_url, filepath)
-                downloaded_segments.append(filepath)
+            workers = [
+                asyncio.create_task(worker())
+                for _ in range(min(Config.DOWNLOAD_CONCURRENCY, total_segments))
+            ]
 
-                if progress_callback:
-                    progress = (i + 1) / total_segments * 100
-                    await progress_callback(f"Downloaded segment {i+1}/{total_segments} ({progress:.1f}%)")
+            # fMP4 playlists carry an initialization section (EXT-X-MAP)
+            # that has to come before the first media segment
+            init_section = getattr(playlist.segments[0], 'init_section', None)
+            if init_section is not None and init_section.uri:
+                init_path = None if in_memory else os.path.join(self.temp_dir, "init.mp4")
+                init_task = asyncio.create_task(self._download_segment(init_section.absolute_uri, init_path))
+                workers.append(init_task)
+                data = await init_task
+                yield init_path if data is None else data
 
-            logger.info(f"Successfully downloaded {len(downloaded_segments)} segments")
-            return downloaded_segments
+            # Reorder buffer keyed on segment index
+            reorder = {}
+            for next_index in range(total_segments):
+                while next_index not in reorder:
+                    i, result = await finished.get()
+                    if isinstance(result, Exception):
+                        if isinstance(result, aiohttp.ClientResponseError) and result.status == 404:
+                            # Segments have rotated out; refetch the playlist next time
+                            _playlist_cache.pop(_playlist_key(url), None)
+                        raise result
+                    reorder[i] = result
+                result = reorder.pop(next_index)
+                yield result
+                if isinstance(result, bytes):
+                    buffered_bytes -= len(result)
+                window.release()
 
         except Exception as e:
             logger.error(f"Error downloading M3U8: {e}")
             raise
 
-    async def _download_segment(self, url: str, filepath: str) -> None:
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    async def load_playlist(self, url: str) -> "m3u8.M3U8":
+        """
+        Fetch and parse an M3U8 playlist over the shared session.
+
+        Master playlists are resolved to their highest-bandwidth variant.
+        Results are cached per URL for PLAYLIST_CACHE_TTL seconds.
+
+        Args:
+            url: M3U8 playlist URL
+
+        Returns:
+            Parsed media playlist
+
+        Raises:
+            ValueError: If a master playlist has no variants
+            Exception: For download errors
+        """
+        # Imported on first use to keep bot startup light
+        import m3u8
+
+        key = _playlist_key(url)
+        now = time.monotonic()
+        cached = _playlist_cache.get(key)
+        if cached and now - cached[0] < PLAYLIST_CACHE_TTL:
+            return cached[1]
+
+        while True:
+            async with self.session.get(url) as response:
+                response.raise_for_status()
+                text = await response.text()
+
+            playlist = m3u8.loads(text, uri=url)
+            if not playlist.is_variant:
+                # Drop expired entries so the cache stays small
+                for stale in [k for k, (ts, _) in _playlist_cache.items() if now - ts >= PLAYLIST_CACHE_TTL]:
+                    del _playlist_cache[stale]
+                _playlist_cache[key] = (now, playlist)
+                return playlist
+
+            if not playlist.playlists:
+                raise ValueError("No variants found in M3U8 master playlist")
+
+            variant = max(playlist.playlists, key=lambda p: p.stream_info.bandwidth or 0)
+            url = variant.absolute_uri
+            logger.info(f"Selected variant playlist: {url}")
+
+    async def _download_segment(self, url: str, filepath: Optional[str]) -> Optional[bytes]:
         """
         Download a single segment.
 
         Args:
             url: Segment URL
-            filepath: Local file path to save segment
+            filepath: Local file path to save segment, or None to keep it in memory
+
+        Returns:
+            Segment data when filepath is None, otherwise None
 
         Raises:
             Exception: For download errors
@@ -107,16 +445,39 @@ class M3U8Downloader:
                 timeout = aiohttp.ClientTimeout(total=Config.SEGMENT_TIMEOUT)
                 async with self.session.get(url, timeout=timeout) as response:
                     response.raise_for_status()
-                    async with aiofiles.open(filepath, 'wb') as f:
-                        async for chunk in response.content.iter_chunked(Config.CHUNK_SIZE):
-                            await f.write(chunk)
+                    if filepath is None:
+                        return await response.read()
+                    if self._uring:
+                        # Buffer the segment, then write it in one submission
+                        chunks = []
+                        while chunk := await response.content.readany():
+                            chunks.append(chunk)
+                        await asyncio.to_thread(self._uring.write, filepath, chunks)
+                    elif response.content_length is not None and response.content_length <= SMALL_SEGMENT_SIZE:
+                        # One thread hop for open + write + close
+                        data = await response.read()
+                        await asyncio.to_thread(_write_segment_sync, filepath, data)
+                    else:
+                        # Writes to a freshly created local file rarely block
+                        with open(filepath, 'wb', buffering=0) as f:
+                            while chunk := await response.content.readany():
+                                f.write(chunk)
                 return  # Success, exit retry loop
 
             except Exception as e:
+                delay = None
+                if isinstance(e, aiohttp.ClientResponseError) and 400 <= e.status < 500:
+                    if e.status not in RETRYABLE_CLIENT_ERRORS:
+                        # Client errors won't fix themselves, so don't retry
+                        logger.error(f"Failed to download segment {url}: {e}")
+                        raise
+                    # Throttled or timed out; wait as long as the server asks
+                    delay = _retry_after(e.headers)
+
                 retry_count += 1
                 if retry_count >= max_retries:
                     logger.error(f"Failed to download segment {url} after {max_retries} retries: {e}")
                     raise
                 else:
                     logger.warning(f"Retry {retry_count}/{max_retries} for segment {url}: {e}")
-                    await asyncio.sleep(1)  # Wait before retry
+                    await asyncio.sleep(_retry_delay(retry_count) if delay is None else delay)
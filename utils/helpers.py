@@ -2,14 +2,25 @@
 Helper functions for the M3U8 Telegram Bot.
 """
 
-import re
+import time
+import asyncio
+import inspect
 import logging
-from datetime import datetime
-from typing import Tuple
+from typing import Awaitable, Callable, Optional, Tuple, Union
 from pyrogram.types import Message
 
+from config.settings import Config
+
 logger = logging.getLogger(__name__)
 
+# Characters that are invalid in filenames on most filesystems
+_BAD_CHARS = str.maketrans({c: '_' for c in '<>:"/\\|?*'})
+
+_SIZE_UNITS = ('B', 'KB', 'MB', 'GB', 'TB')
+
+# Progress callbacks may be plain functions or coroutine functions
+ProgressCallback = Callable[[str], Union[None, Awaitable[None]]]
+
 
 def parse_url_and_filename(text: str) -> Tuple[str, str]:
     """
@@ -27,7 +38,7 @@ def parse_url_and_filename(text: str) -> Tuple[str, str]:
         filename = filename.strip()
 
         # Clean filename - remove invalid characters
-        filename = re.sub(r'[<>:"/\\|?*]', '_', filename)
+        filename = filename.translate(_BAD_CHARS)
 
         # Ensure .mp4 extension
         if not filename.lower().endswith('.mp4'):
@@ -36,7 +47,7 @@ def parse_url_and_filename(text: str) -> Tuple[str, str]:
         return url, filename
     else:
         # Generate filename from timestamp if no custom name provided
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        timestamp = time.strftime("%Y%m%d_%H%M%S")
         return text.strip(), f"video_{timestamp}.mp4"
 
 
@@ -54,6 +65,84 @@ async def update_progress(message: Message, text: str) -> None:
         logger.warning(f"Failed to update progress: {e}")
 
 
+async def report_progress(progress_callback: Optional[ProgressCallback], text: str) -> None:
+    """
+    Invoke a progress callback, awaiting it if it returns an awaitable.
+
+    Args:
+        progress_callback: Optional callback for progress updates
+        text: Progress text
+    """
+    if progress_callback:
+        result = progress_callback(text)
+        if inspect.isawaitable(result):
+            await result
+
+
+class ProgressReporter:
+    """Coalesces progress updates into throttled edits of a Telegram message."""
+
+    def __init__(self, message: Message, interval: Optional[float] = None):
+        self.message = message
+        self.interval = Config.PROGRESS_INTERVAL if interval is None else interval
+        self._pending: Optional[str] = None
+        self._generation = 0
+        self._wakeup = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def update(self, text: str) -> None:
+        """
+        Queue a progress update without waiting for Telegram.
+
+        Only the latest pending text is sent, at most once per interval.
+
+        Args:
+            text: New text content
+        """
+        self._pending = text
+        self._wakeup.set()
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def send(self, text: str) -> None:
+        """
+        Send a terminal or phase-changing update immediately.
+
+        Any pending throttled update is discarded.
+
+        Args:
+            text: New text content
+        """
+        self._pending = None
+        self._generation += 1
+        async with self._lock:
+            await update_progress(self.message, text)
+
+    async def close(self) -> None:
+        """Stop the background sender, dropping any pending update."""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        """Send the latest pending text, then wait out the interval."""
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            text, self._pending = self._pending, None
+            if text is None:
+                continue
+
+            generation = self._generation
+            async with self._lock:
+                # Don't overwrite an update that was sent directly meanwhile
+                if generation == self._generation:
+                    await update_progress(self.message, text)
+            await asyncio.sleep(self.interval)
+
+
 def format_file_size(size_bytes: int) -> str:
     """
     Format file size in human readable format.
@@ -66,12 +155,10 @@ def format_file_size(size_bytes: int) -> str:
     """
     if size_bytes < 1024:
         return f"{size_bytes} B"
-    elif size_bytes < 1024 * 1024:
-        return f"{size_bytes / 1024:.1f} KB"
-    elif size_bytes < 1024 * 1024 * 1024:
-        return f"{size_bytes / (1024 * 1024):.1f} MB"
-    else:
-        return f"{size_bytes / (1024 * 1024 * 1024):.1f} GB"
+
+    # Each unit spans 10 bits, so the bit length picks the unit directly
+    idx = min((size_bytes.bit_length() - 1) // 10, len(_SIZE_UNITS) - 1)
+    return f"{size_bytes / (1 << (idx * 10)):.1f} {_SIZE_UNITS[idx]}"
 
 
 def clean_filename(filename: str) -> str:
@@ -85,10 +172,11 @@ def clean_filename(filename: str) -> str:
         Cleaned filename
     """
     # Remove invalid characters for most filesystems
-    cleaned = re.sub(r'[<>:"/\\|?*]', '_', filename)
+    cleaned = filename.translate(_BAD_CHARS)
 
     # Remove multiple consecutive underscores
-    cleaned = re.sub(r'_{2,}', '_', cleaned)
+    while '__' in cleaned:
+        cleaned = cleaned.replace('__', '_')
 
     # Remove leading/trailing underscores and spaces
     cleaned = cleaned.strip('_ ')
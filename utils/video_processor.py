@@ -3,39 +3,336 @@ Video processing module for merging and splitting video files.
 """
 
 import os
+import sys
+import time
+import glob
+import json
+import shutil
 import subprocess
 import asyncio
 import tempfile
-import math
+import contextlib
+import weakref
 import logging
-from typing import List, Callable, Optional
+from typing import AsyncGenerator, AsyncIterator, ClassVar, Dict, List, Optional, Tuple, Union
 from pathlib import Path
 
 from config.settings import Config
+from utils.helpers import ProgressCallback, format_file_size, report_progress
 
 logger = logging.getLogger(__name__)
 
+# Longest a keyframe index scan may take before falling back to
+# duration-based split points
+KEYFRAME_PROBE_TIMEOUT = 30.0  # seconds
+
+# Per-part split runs to try before giving up on parts that overshoot
+SPLIT_ATTEMPTS = 3
+
+# Loop the pidfd child watcher is attached to, see _use_pidfd_watcher
+_pidfd_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _append_segment(out_fd: int, segment: str) -> int:
+    """
+    Append one segment file to an open file descriptor.
+
+    On Linux the copy is done in kernel space with os.sendfile.
+
+    Args:
+        out_fd: File descriptor opened for writing
+        segment: Segment file path
+
+    Returns:
+        Number of bytes appended
+    """
+    in_fd = os.open(segment, os.O_RDONLY)
+    try:
+        size = os.fstat(in_fd).st_size
+        if sys.platform.startswith('linux'):
+            offset = 0
+            while offset < size:
+                sent = os.sendfile(out_fd, in_fd, offset, size - offset)
+                if sent == 0:
+                    break
+                offset += sent
+        else:
+            with open(in_fd, 'rb', closefd=False) as src, \
+                    open(out_fd, 'wb', closefd=False) as dst:
+                shutil.copyfileobj(src, dst, Config.CHUNK_SIZE)
+        return size
+    finally:
+        os.close(in_fd)
+
+
+def _ts_concat(segments: List[str], output_path: str) -> int:
+    """
+    Concatenate MPEG-TS segments byte for byte.
+
+    TS is a stream format, so the joined bytes form a valid stream.
+
+    Args:
+        segments: List of segment file paths
+        output_path: Path of the concatenated file
+
+    Returns:
+        Size of the concatenated file in bytes
+    """
+    out_fd = os.open(output_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        # Reserve the final size up front so the filesystem can lay the
+        # file out contiguously instead of growing it extent by extent
+        if hasattr(os, 'posix_fallocate'):
+            try:
+                os.posix_fallocate(out_fd, 0, sum(os.path.getsize(segment) for segment in segments))
+            except OSError:
+                pass
+        return sum(_append_segment(out_fd, segment) for segment in segments)
+    finally:
+        os.close(out_fd)
+
+
+async def _read_tail(stream: asyncio.StreamReader, maxlen: int = 64 * 1024) -> bytes:
+    """
+    Drain a subprocess stream, keeping only its last bytes.
+
+    Args:
+        stream: Stream to drain until EOF
+        maxlen: Number of trailing bytes to keep
+
+    Returns:
+        The last ``maxlen`` bytes of the stream
+    """
+    tail = bytearray()
+    while chunk := await stream.read(4096):
+        tail += chunk
+        if len(tail) > maxlen:
+            del tail[:-maxlen]
+    return bytes(tail)
+
+
+# Top-level box types an MP4/fMP4 (ISO BMFF) segment can start with
+_MP4_BOXES = {b'ftyp', b'styp', b'moov', b'moof', b'sidx', b'mdat', b'free', b'emsg', b'prft'}
+
+
+def _read_head(segment: str, size: int = 189) -> bytes:
+    """Read the first bytes of a segment file for sniffing."""
+    with open(segment, 'rb') as f:
+        return f.read(size)
+
+
+def _is_mpegts_head(head: bytes) -> bool:
+    """Check for MPEG-TS sync bytes at the start of the first two packets."""
+    return head[:1] == b'\x47' and (len(head) < 189 or head[188:189] == b'\x47')
+
+
+def _is_mpegts(segment: str) -> bool:
+    """Check whether a segment file holds MPEG-TS."""
+    return _is_mpegts_head(_read_head(segment))
+
+
+def _needs_aac_adtstoasc(head: bytes) -> bool:
+    """
+    Check whether AAC audio may still be ADTS framed, from a segment's first bytes.
+
+    MP4/fMP4 segments already carry raw AAC, so the bitstream filter would
+    only walk every audio packet for nothing.
+    """
+    return head[4:8] not in _MP4_BOXES
+
+
+def _plan_split_times(keyframes: List[Tuple[float, int]], part_size: int, file_size: int) -> List[float]:
+    """
+    Choose keyframe timestamps that cut a file into parts of at most part_size.
+
+    Each cut is placed on the last keyframe whose byte position still fits
+    in the current part, so stream-copied parts start cleanly on a keyframe.
+    A part can only exceed part_size if a single GOP does.
+
+    Args:
+        keyframes: (pts seconds, byte position) of each keyframe, in order
+        part_size: Target maximum bytes per part
+        file_size: Size of the file, so the tail after the last keyframe
+            is counted too
+
+    Returns:
+        Cut timestamps in seconds, in ascending order
+    """
+    split_times = []
+    start_pos = 0
+    previous = None
+    # End of file acts as a final boundary with no keyframe of its own
+    for pts, pos in [*keyframes, (None, file_size)]:
+        if pos - start_pos > part_size and previous and previous[1] > start_pos:
+            split_times.append(previous[0])
+            start_pos = previous[1]
+        previous = (pts, pos)
+    return split_times
+
+
+def _drop_page_cache(path: str) -> None:
+    """
+    Tell the kernel a file's cached pages won't be read again.
+
+    Only a hint: it's a no-op where posix_fadvise is unavailable, and
+    errors (e.g. the file is already gone) are ignored.
+
+    Args:
+        path: File whose page cache can be released
+    """
+    if not hasattr(os, 'posix_fadvise'):
+        return
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _use_pidfd_watcher() -> None:
+    """
+    Reap subprocesses through pidfds on the running loop (Linux, Python 3.11).
+
+    The default ThreadedChildWatcher parks one thread per child; a pidfd
+    watcher waits on each child's fd from the event loop instead. Python
+    3.12+ already picks pidfds by itself, so this only acts on 3.11.
+    """
+    global _pidfd_loop
+    if sys.version_info >= (3, 12) or not hasattr(os, 'pidfd_open'):
+        return
+    loop = asyncio.get_running_loop()
+    if _pidfd_loop is loop:
+        return
+    try:
+        os.close(os.pidfd_open(os.getpid()))  # needs Linux 5.3+
+    except OSError:
+        return
+    watcher = asyncio.PidfdChildWatcher()
+    watcher.attach_loop(loop)
+    asyncio.set_child_watcher(watcher)
+    _pidfd_loop = loop
+
+
+def _write_all(fd: int, data: bytes) -> int:
+    """Write all of data to fd, retrying after short writes."""
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+    return len(data)
+
+
+def _read_segment(segment: str) -> bytes:
+    """Read a whole segment file and remove it from disk."""
+    with open(segment, 'rb') as f:
+        data = f.read()
+    os.remove(segment)
+    return data
+
 
 class VideoProcessor:
     """Handles video merging and splitting operations."""
 
-    def __init__(self):
-        self.temp_dir = tempfile.mkdtemp()
+    # Caps concurrent CPU/IO-bound ffmpeg runs across all instances. A
+    # semaphore binds to the loop that first uses it, so keep one per loop
+    _ffmpeg_semaphores: ClassVar["weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]"] = \
+        weakref.WeakKeyDictionary()
+    # Tasks that free a slot when their process exits, kept referenced here
+    # so they can't be garbage-collected while still waiting
+    _slot_holders: ClassVar[set] = set()
+
+    def __init__(self, fragmented: bool = False):
+        """
+        Args:
+            fragmented: Write fragmented MP4 (moov up front, no faststart
+                rewrite pass) instead of a regular faststart MP4
+        """
+        self._tmp = tempfile.TemporaryDirectory(prefix="vp_")
+        self.temp_dir = self._tmp.name
+        # ffprobe results keyed by (path, size, mtime_ns)
+        self._duration_cache: Dict[Tuple[str, int, int], float] = {}
+        self._keyframe_cache: Dict[Tuple[str, int, int], List[Tuple[float, int]]] = {}
+        # Fragmented output is written front to back in one pass; faststart
+        # reads the whole file back to move moov to the front
+        self.movflags = '+frag_keyframe+empty_moov' if fragmented else '+faststart'
+
+    async def __aenter__(self):
+        """Async context manager entry."""
+        _use_pidfd_watcher()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        """Async context manager exit."""
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        """Remove the temporary directory and everything in it."""
+        await asyncio.to_thread(self._tmp.cleanup)
+
+    @classmethod
+    def _get_semaphore(cls) -> asyncio.Semaphore:
+        """Return the running loop's ffmpeg semaphore, creating it if needed."""
+        loop = asyncio.get_running_loop()
+        semaphore = cls._ffmpeg_semaphores.get(loop)
+        if semaphore is None:
+            semaphore = cls._ffmpeg_semaphores[loop] = asyncio.Semaphore(min(8, os.cpu_count() or 1))
+        return semaphore
+
+    async def _spawn(self, cmd: List[str], gated: bool = True, **kwargs) -> asyncio.subprocess.Process:
+        """
+        Start an ffmpeg/ffprobe process, once a shared slot is free if gated.
+
+        The slot is held until the process exits, so the cap applies to
+        running processes and not just to process starts.
+
+        Args:
+            cmd: Command line to run
+            gated: Count the process against the shared cap. Leave this off
+                for processes that mostly idle on input, such as a merge fed
+                by a download in progress
+            **kwargs: Passed through to asyncio.create_subprocess_exec
+
+        Returns:
+            The started process
+        """
+        _use_pidfd_watcher()
+        if not gated:
+            return await asyncio.create_subprocess_exec(*cmd, **kwargs)
+
+        semaphore = self._get_semaphore()
+        await semaphore.acquire()
+        try:
+            process = await asyncio.create_subprocess_exec(*cmd, **kwargs)
+        except BaseException:
+            semaphore.release()
+            raise
+
+        async def hold_slot() -> None:
+            try:
+                await process.wait()
+            finally:
+                semaphore.release()
 
-    def __del__(self):
-        """Cleanup temporary directory."""
-        if hasattr(self, 'temp_dir') and os.path.exists(self.temp_dir):
-            import shutil
-            shutil.rmtree(self.temp_dir)
+        holder = asyncio.create_task(hold_slot())
+        self._slot_holders.add(holder)
+        holder.add_done_callback(self._slot_holders.discard)
+        return process
 
     async def merge_segments(
         self, 
         segments: List[str], 
         output_filename: str,
-        progress_callback: Optional[Callable[[str], None]] = None
-    ) -> str:
+        progress_callback: Optional[ProgressCallback] = None
+    ) -> Tuple[str, int]:
         """
-        Merge video segments into a single MP4 file.
+        Merge video segments into a single video file.
+
+        MPEG-TS segments are joined in-process; ffmpeg only runs to remux
+        into the container implied by the output filename (e.g. ``.mp4``).
 
         Args:
             segments: List of segment file paths
@@ -43,63 +340,333 @@ class VideoProcessor:
             progress_callback: Optional callback for progress updates
 
         Returns:
-            Path to merged video file
+            Tuple of (path to merged video file, its size in bytes)
 
         Raises:
             RuntimeError: If ffmpeg fails
             Exception: For other merge errors
         """
         try:
-            if progress_callback:
-                await progress_callback("Preparing to merge segments...")
+            await report_progress(progress_callback, "Preparing to merge segments...")
 
             output_path = os.path.join(self.temp_dir, output_filename)
+            stdin_data: Optional[bytes] = None
 
-            # Create input file list for ffmpeg
-            input_list_path = os.path.join(self.temp_dir, "input_list.txt")
-            with open(input_list_path, 'w') as f:
-                for segment in segments:
-                    f.write(f"file '{os.path.abspath(segment)}'\n")
+            # Byte-level concat only works for MPEG-TS; sniff the content
+            # since HLS segment names don't reliably say what they hold
+            if await asyncio.to_thread(lambda: all(map(_is_mpegts, segments))):
+                if output_path.lower().endswith('.ts'):
+                    # TS output needs no remux at all
+                    output_size = await asyncio.to_thread(_ts_concat, segments, output_path)
+                    await report_progress(progress_callback, "Video merging completed!")
+                    logger.info(f"Successfully merged video: {output_path}")
+                    return output_path, output_size
 
-            # FFmpeg command to merge segments
-            cmd = [
-                'ffmpeg',
-                '-f', 'concat',
-                '-safe', '0',
-                '-i', input_list_path,
-                '-c', 'copy',
-                '-bsf:a', 'aac_adtstoasc',  # Fix AAC issues
-                '-y',  # Overwrite output file
-                output_path
-            ]
+                # Join the TS bytes in-process, then remux once to MP4
+                input_path = os.path.join(self.temp_dir, "concat.ts")
+                await asyncio.to_thread(_ts_concat, segments, input_path)
+                cmd = [
+                    'ffmpeg',
+                    '-f', 'mpegts',
+                    '-seekable', '0',
+                    '-thread_queue_size', '1024',
+                    '-i', input_path,
+                    '-c', 'copy',
+                    '-bsf:a', 'aac_adtstoasc',  # Fix AAC issues
+                    '-movflags', self.movflags,
+                    '-progress', 'pipe:1',
+                    '-nostats',
+                    '-y',  # Overwrite output file
+                    output_path
+                ]
+            else:
+                # Feed the concat list on stdin instead of a temp file;
+                # joining onto cwd leaves absolute paths untouched
+                cwd = os.getcwd()
+                stdin_data = ''.join(f"file '{os.path.join(cwd, segment)}'\n" for segment in segments).encode()
+                input_path = None
+                # Not TS; MP4/fMP4 content already has raw AAC
+                needs_bsf = _needs_aac_adtstoasc(await asyncio.to_thread(_read_head, segments[0], 8))
+
+                # FFmpeg command to merge segments
+                cmd = [
+                    'ffmpeg',
+                    '-f', 'concat',
+                    '-safe', '0',
+                    '-protocol_whitelist', 'pipe,file',
+                    '-thread_queue_size', '1024',
+                    '-i', 'pipe:0',
+                    '-c', 'copy',
+                    *(['-bsf:a', 'aac_adtstoasc'] if needs_bsf else []),  # Fix AAC issues
+                    '-movflags', self.movflags,
+                    '-progress', 'pipe:1',
+                    '-nostats',
+                    '-y',  # Overwrite output file
+                    output_path
+                ]
 
-            if progress_callback:
-                await progress_callback("Merging segments with ffmpeg...")
+            await report_progress(progress_callback, "Merging segments with ffmpeg...")
 
             # Run ffmpeg
-            process = await asyncio.create_subprocess_exec(
-                *cmd,
+            process = await self._spawn(
+                cmd,
+                stdin=asyncio.subprocess.PIPE if stdin_data is not None else asyncio.subprocess.DEVNULL,
                 stdout=asyncio.subprocess.PIPE,
                 stderr=asyncio.subprocess.PIPE
             )
 
-            stdout, stderr = await process.communicate()
+            progress_task = asyncio.create_task(self._read_progress(process.stdout, progress_callback))
+            stderr_task = asyncio.create_task(_read_tail(process.stderr))
+            if stdin_data is not None:
+                try:
+                    process.stdin.write(stdin_data)
+                    await process.stdin.drain()
+                except (BrokenPipeError, ConnectionResetError):
+                    # ffmpeg exited early; its stderr explains why
+                    pass
+                finally:
+                    process.stdin.close()
+
+            stderr = await stderr_task
+            await process.wait()
+            output_size = await progress_task
+            if input_path:
+                os.remove(input_path)
 
             if process.returncode != 0:
                 error_msg = stderr.decode() if stderr else "Unknown ffmpeg error"
                 logger.error(f"FFmpeg error: {error_msg}")
                 raise RuntimeError(f"FFmpeg failed: {error_msg}")
 
-            if progress_callback:
-                await progress_callback("Video merging completed!")
+            # Only stat the file if ffmpeg never reported a size
+            output_size = output_size or os.path.getsize(output_path)
+
+            # The segments have been read for the last time
+            await asyncio.to_thread(lambda: [_drop_page_cache(segment) for segment in segments])
+
+            await report_progress(progress_callback, "Video merging completed!")
 
             logger.info(f"Successfully merged video: {output_path}")
-            return output_path
+            return output_path, output_size
 
         except Exception as e:
             logger.error(f"Error merging segments: {e}")
             raise
 
+    async def merge_stream(
+        self,
+        segments: AsyncGenerator[Union[str, bytes], None],
+        output_filename: str,
+        progress_callback: Optional[ProgressCallback] = None
+    ) -> Tuple[str, int]:
+        """
+        Merge segments while they are still being downloaded.
+
+        ffmpeg is started once the first segment arrives, reading from stdin
+        in the format sniffed from that segment (MPEG-TS or fMP4), and each
+        segment is piped in as soon as it arrives, then deleted. TS segments
+        merged to a ``.ts`` output are appended directly without ffmpeg.
+
+        Args:
+            segments: Async generator of segment file paths, or in-memory
+                segment bytes, in playlist order. It is closed when the merge
+                ends, including when ffmpeg exits early
+            output_filename: Name for output file
+            progress_callback: Optional callback for progress updates
+
+        Returns:
+            Tuple of (path to merged video file, its size in bytes)
+
+        Raises:
+            ValueError: If there are no segments
+            RuntimeError: If ffmpeg fails
+            Exception: For other merge errors
+        """
+        output_path = os.path.join(self.temp_dir, output_filename)
+        ts_output = output_path.lower().endswith('.ts')
+
+        async with contextlib.aclosing(segments):
+            try:
+                first = await anext(segments, None)
+                if first is None:
+                    raise ValueError("No segments to merge")
+                if isinstance(first, bytes):
+                    head = first[:189]
+                else:
+                    head = await asyncio.to_thread(_read_head, first)
+                is_ts = _is_mpegts_head(head)
+
+                if is_ts and ts_output:
+                    output_size = await self._append_stream(first, segments, output_path)
+                else:
+                    output_size = await self._pipe_stream(
+                        first, segments, output_path, progress_callback,
+                        input_format='mpegts' if is_ts else None,
+                        needs_bsf=_needs_aac_adtstoasc(head) and not ts_output
+                    )
+            except Exception as e:
+                logger.error(f"Error merging segments: {e}")
+                raise
+
+        await report_progress(progress_callback, "Video merging completed!")
+
+        logger.info(f"Successfully merged video: {output_path}")
+        return output_path, output_size
+
+    async def _append_stream(
+        self,
+        first: Union[str, bytes],
+        segments: AsyncIterator[Union[str, bytes]],
+        output_path: str
+    ) -> int:
+        """
+        Append TS segments to the output file as they arrive.
+
+        Args:
+            first: First segment, already taken from the iterator
+            segments: Remaining segments
+            output_path: Path of the merged file
+
+        Returns:
+            Size of the merged file in bytes
+        """
+        output_size = 0
+        out_fd = os.open(output_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            segment = first
+            while segment is not None:
+                if isinstance(segment, bytes):
+                    output_size += await asyncio.to_thread(_write_all, out_fd, segment)
+                else:
+                    output_size += await asyncio.to_thread(_append_segment, out_fd, segment)
+                    os.remove(segment)
+                segment = await anext(segments, None)
+        finally:
+            os.close(out_fd)
+        return output_size
+
+    async def _pipe_stream(
+        self,
+        first: Union[str, bytes],
+        segments: AsyncIterator[Union[str, bytes]],
+        output_path: str,
+        progress_callback: Optional[ProgressCallback],
+        input_format: Optional[str],
+        needs_bsf: bool
+    ) -> int:
+        """
+        Pipe segments into an ffmpeg remux as they arrive.
+
+        Args:
+            first: First segment, already taken from the iterator
+            segments: Remaining segments
+            output_path: Path of the merged file
+            progress_callback: Optional callback for progress updates
+            input_format: Forced ffmpeg input format, or None to let it probe
+            needs_bsf: Apply the aac_adtstoasc bitstream filter
+
+        Returns:
+            Size of the merged file in bytes
+
+        Raises:
+            RuntimeError: If ffmpeg fails
+        """
+        cmd = [
+            'ffmpeg',
+            *(['-f', input_format] if input_format else []),
+            '-thread_queue_size', '1024',
+            '-i', 'pipe:0',
+            '-c', 'copy',
+            *(['-bsf:a', 'aac_adtstoasc'] if needs_bsf else []),  # Fix AAC issues
+            *(['-movflags', self.movflags] if not output_path.lower().endswith('.ts') else []),
+            '-progress', 'pipe:1',
+            '-nostats',
+            '-y',  # Overwrite output file
+            output_path
+        ]
+
+        # Not gated: this ffmpeg waits on the download most of the time, and
+        # holding a slot would queue other users' jobs behind the network
+        process = await self._spawn(
+            cmd,
+            gated=False,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        # Drain both pipes concurrently so ffmpeg never blocks on a full one
+        progress_task = asyncio.create_task(self._read_progress(process.stdout, progress_callback))
+        stderr_task = asyncio.create_task(_read_tail(process.stderr))
+
+        try:
+            try:
+                segment = first
+                while segment is not None:
+                    if isinstance(segment, bytes):
+                        data = segment
+                    else:
+                        data = await asyncio.to_thread(_read_segment, segment)
+                    process.stdin.write(data)
+                    await process.stdin.drain()
+                    segment = await anext(segments, None)
+            except (BrokenPipeError, ConnectionResetError):
+                # ffmpeg exited early; its stderr explains why
+                pass
+            finally:
+                process.stdin.close()
+
+            await process.wait()
+            stderr = await stderr_task
+            output_size = await progress_task
+
+            if process.returncode != 0:
+                error_msg = stderr.decode() if stderr else "Unknown ffmpeg error"
+                logger.error(f"FFmpeg error: {error_msg}")
+                raise RuntimeError(f"FFmpeg failed: {error_msg}")
+
+            # Only stat the file if ffmpeg never reported a size
+            return output_size or os.path.getsize(output_path)
+
+        except BaseException:
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+            stderr_task.cancel()
+            progress_task.cancel()
+            raise
+
+    async def _read_progress(
+        self,
+        stream: asyncio.StreamReader,
+        progress_callback: Optional[ProgressCallback] = None
+    ) -> int:
+        """
+        Parse ffmpeg ``-progress`` output and forward it as progress updates.
+
+        Args:
+            stream: ffmpeg stdout carrying key=value progress lines
+            progress_callback: Optional callback for progress updates
+
+        Returns:
+            Final output size in bytes as reported by ffmpeg
+        """
+        total_size = 0
+        out_time_us = 0
+        async for line in stream:
+            key, _, value = line.decode(errors='replace').strip().partition('=')
+            if key == 'total_size' and value.isdigit():
+                total_size = int(value)
+            elif key == 'out_time_ms' and value.isdigit():
+                # Despite the name, ffmpeg reports microseconds here
+                out_time_us = int(value)
+            elif key == 'progress' and progress_callback:
+                muxed = time.strftime("%H:%M:%S", time.gmtime(out_time_us // 1_000_000))
+                await report_progress(
+                    progress_callback,
+                    f"Merging segments with ffmpeg... {muxed} muxed, {format_file_size(total_size)}"
+                )
+        return total_size
+
     async def split_large_file(
         self, 
         file_path: str, 
@@ -115,10 +682,11 @@ class VideoProcessor:
             max_size: Maximum size per part (defaults to Config.MAX_FILE_SIZE)
 
         Returns:
-            List of split file paths
+            List of split file paths, each at most max_size bytes
 
         Raises:
-            Exception: For splitting errors
+            RuntimeError: If no parts are produced or parts stay over max_size
+            Exception: For other splitting errors
         """
         if max_size is None:
             max_size = Config.MAX_FILE_SIZE
@@ -128,54 +696,211 @@ class VideoProcessor:
             return [file_path]
 
         try:
-            parts = []
-            part_size = max_size - (10 * 1024 * 1024)  # Leave 10MB buffer
-            num_parts = math.ceil(file_size / part_size)
+            # Headroom per part for the container overhead (moov sample
+            # tables, mostly) a stream copy adds; it grows with the part, so
+            # take a small share of the part limit, never more than 10MB
+            overhead = min(max(max_size // 256, 256 * 1024), 10 * 1024 * 1024)
+            part_size = max_size - overhead
+            num_parts = -(-file_size // part_size)
 
-            # Get video duration first
-            duration = await self._get_video_duration(file_path)
-            part_duration = duration / num_parts
+            # Get video duration first, in whole microseconds so part
+            # boundaries don't accumulate float rounding error
+            duration_us = int(await self._get_video_duration(file_path) * 1_000_000)
 
             base_name = os.path.splitext(base_filename)[0]
 
-            for i in range(num_parts):
-                start_time = i * part_duration
-                part_filename = f"{base_name}_part{i+1:02d}.mp4"
-                part_path = os.path.join(self.temp_dir, part_filename)
-
-                # Use ffmpeg to split the file
-                cmd = [
-                    'ffmpeg',
-                    '-i', file_path,
-                    '-ss', str(start_time),
-                    '-t', str(part_duration),
-                    '-c', 'copy',
-                    '-avoid_negative_ts', 'make_zero',
-                    '-y',
-                    part_path
+            # Cut on keyframes sized to the limit when the index is available
+            split_times = _plan_split_times(await self._probe_keyframes(file_path), part_size, file_size)
+            if split_times:
+                num_parts = len(split_times) + 1
+                segment_args = [
+                    '-segment_times', ','.join(f"{t:.6f}" for t in split_times),
+                    # Cut times come from rounded pts_time values; without
+                    # slack a cut a hair past its keyframe slips a whole GOP
+                    '-segment_time_delta', '0.005'
                 ]
+            else:
+                segment_args = ['-segment_time', f"{duration_us // num_parts / 1_000_000:.6f}"]
 
-                process = await asyncio.create_subprocess_exec(
-                    *cmd,
-                    stdout=asyncio.subprocess.PIPE,
-                    stderr=asyncio.subprocess.PIPE
-                )
+            # Split in a single pass with ffmpeg's segment muxer
+            # The muxer expands %d in the whole path, so escape literal '%'
+            part_pattern = os.path.join(self.temp_dir, base_name).replace('%', '%%') + "_part%02d.mp4"
+            part_glob = os.path.join(glob.escape(self.temp_dir), f"{glob.escape(base_name)}_part*.mp4")
+            # Parts are found by name afterwards, so clear any from an earlier split
+            for part in glob.glob(part_glob):
+                os.remove(part)
+            cmd = [
+                'ffmpeg',
+                '-i', file_path,
+                '-c', 'copy',
+                '-map', '0',
+                '-f', 'segment',
+                *segment_args,
+                '-segment_format', 'mp4',
+                '-segment_start_number', '1',
+                '-reset_timestamps', '1',
+                '-avoid_negative_ts', 'make_zero',
+                '-y',
+                part_pattern
+            ]
+
+            process = await self._spawn(
+                cmd,
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.PIPE
+            )
+
+            stderr, _ = await asyncio.gather(_read_tail(process.stderr), process.wait())
+            parts = sorted(glob.glob(part_glob))
+            if process.returncode != 0:
+                logger.warning(f"Segment muxer failed, splitting part by part: {stderr.decode(errors='replace')}")
+            elif not parts:
+                logger.warning("Segment muxer wrote no parts, splitting part by part")
+            else:
+                largest = max((os.path.getsize(part) for part in parts), default=0)
+                if largest <= max_size:
+                    await asyncio.to_thread(_drop_page_cache, file_path)
+                    logger.info(f"Created {len(parts)} parts in a single pass")
+                    return parts
 
-                await process.communicate()
-                if process.returncode == 0 and os.path.exists(part_path):
-                    parts.append(part_path)
-                    logger.info(f"Created part {i+1}/{num_parts}: {part_filename}")
+                # Keyframe placement made a part overshoot; cut smaller pieces
+                logger.warning(f"Single-pass part is {largest} bytes, over {max_size}; splitting part by part")
+                num_parts = -(-num_parts * largest // part_size)
 
-            return parts
+            for _ in range(SPLIT_ATTEMPTS):
+                for part in parts:
+                    os.remove(part)
+                parts = await self._split_per_part(file_path, base_name, num_parts, duration_us // num_parts)
+                if not parts:
+                    raise RuntimeError("Splitting produced no parts")
+
+                largest = max(os.path.getsize(part) for part in parts)
+                if largest <= max_size:
+                    await asyncio.to_thread(_drop_page_cache, file_path)
+                    return parts
+
+                # Cuts snap to keyframes, so a part can still overshoot
+                logger.warning(f"Part is {largest} bytes, over {max_size}; retrying with more parts")
+                num_parts = max(num_parts + 1, -(-num_parts * largest // part_size))
+
+            for part in parts:
+                os.remove(part)
+            raise RuntimeError(f"Could not split video into parts of at most {format_file_size(max_size)}")
 
         except Exception as e:
             logger.error(f"Error splitting file: {e}")
             raise
 
+    async def _split_per_part(
+        self,
+        file_path: str,
+        base_name: str,
+        num_parts: int,
+        part_duration_us: int
+    ) -> List[str]:
+        """
+        Split a video with one ffmpeg run per part.
+
+        Args:
+            file_path: Path to video file to split
+            base_name: Base name for split parts, without extension
+            num_parts: Number of parts to create
+            part_duration_us: Duration of each part in microseconds
+
+        Returns:
+            List of split file paths
+
+        Raises:
+            RuntimeError: If ffmpeg fails on any part
+        """
+        # Parts cover disjoint time ranges, so they can run side by side
+        semaphore = asyncio.Semaphore(max(1, (os.cpu_count() or 1) // 2))
+
+        async def make_part(i: int) -> str:
+            part_filename = f"{base_name}_part{i+1:02d}.mp4"
+            part_path = os.path.join(self.temp_dir, part_filename)
+
+            # Seeking before -i jumps to the nearest keyframe via the index
+            cmd = [
+                'ffmpeg',
+                '-ss', f"{i * part_duration_us / 1_000_000:.6f}",
+                '-i', file_path,
+                '-t', f"{part_duration_us / 1_000_000:.6f}",
+                '-c', 'copy',
+                '-avoid_negative_ts', 'make_zero',
+                '-y',
+                part_path
+            ]
+
+            async with semaphore:
+                process = await self._spawn(
+                    cmd,
+                    stdout=asyncio.subprocess.DEVNULL,
+                    stderr=asyncio.subprocess.PIPE
+                )
+                try:
+                    stderr, _ = await asyncio.gather(_read_tail(process.stderr), process.wait())
+                except asyncio.CancelledError:
+                    # Another part failed; don't leave this ffmpeg running
+                    process.kill()
+                    await process.wait()
+                    raise
+
+            if process.returncode != 0 or not os.path.exists(part_path):
+                raise RuntimeError(
+                    f"Failed to create part {i+1}/{num_parts}: {stderr.decode(errors='replace')}"
+                )
+            logger.info(f"Created part {i+1}/{num_parts}: {part_filename}")
+            return part_path
+
+        # A failed part cancels the rest instead of leaving a gap
+        try:
+            async with asyncio.TaskGroup() as tg:
+                tasks = [tg.create_task(make_part(i)) for i in range(num_parts)]
+        except ExceptionGroup as eg:
+            for error in eg.exceptions:
+                logger.error(f"Part split error: {error}")
+            raise eg.exceptions[0]
+
+        return [task.result() for task in tasks]
+
+    async def get_durations(self, paths: List[str]) -> Dict[str, float]:
+        """
+        Get durations for several videos, probing them concurrently.
+
+        Args:
+            paths: Paths to video files
+
+        Returns:
+            Mapping of path to duration in seconds
+        """
+        semaphore = asyncio.Semaphore(os.cpu_count() or 1)
+
+        async def probe(path: str) -> Tuple[str, float]:
+            async with semaphore:
+                return path, await self._probe_duration(path)
+
+        return dict(await asyncio.gather(*(probe(path) for path in dict.fromkeys(paths))))
+
     async def _get_video_duration(self, file_path: str) -> float:
         """
         Get video duration using ffprobe.
 
+        Args:
+            file_path: Path to video file
+
+        Returns:
+            Duration in seconds
+        """
+        return (await self.get_durations([file_path]))[file_path]
+
+    async def _probe_duration(self, file_path: str) -> float:
+        """
+        Probe a single video's duration.
+
+        Results are cached per file version, so repeated probes of an
+        unchanged file don't spawn ffprobe again.
+
         Args:
             file_path: Path to video file
 
@@ -183,28 +908,153 @@ class VideoProcessor:
             Duration in seconds
         """
         try:
+            st = os.stat(file_path)
+            key = (file_path, st.st_size, st.st_mtime_ns)
+            if key in self._duration_cache:
+                return self._duration_cache[key]
+
+            info = await self._probe(file_path, 'format=duration')
+            duration = info.get('format', {}).get('duration') if info else None
+            if duration is None:
+                # Some containers only carry per-stream durations
+                info = await self._probe(file_path, 'stream=duration')
+                durations = [
+                    float(stream['duration'])
+                    for stream in (info or {}).get('streams', [])
+                    if stream.get('duration') not in (None, 'N/A')
+                ]
+                duration = max(durations) if durations else None
+
+            if duration is not None:
+                duration = float(duration)
+                self._duration_cache[key] = duration
+                return duration
+            else:
+                logger.warning("Could not get video duration, using default")
+                return 3600.0  # Default 1 hour
+
+        except Exception as e:
+            logger.warning(f"Error getting video duration: {e}")
+            return 3600.0  # Default 1 hour
+
+    async def _probe_keyframes(self, file_path: str) -> List[Tuple[float, int]]:
+        """
+        List video keyframes with their byte positions using ffprobe.
+
+        Timestamps are made relative to the file's start time, matching
+        what ffmpeg's output (and so the segment muxer) sees. The scan reads
+        the whole file, so it is bounded by KEYFRAME_PROBE_TIMEOUT. Results
+        are cached per file version like durations.
+
+        Args:
+            file_path: Path to video file
+
+        Returns:
+            (pts seconds, byte position) per keyframe, or an empty list if
+            the index could not be read in time
+        """
+        try:
+            st = os.stat(file_path)
+            key = (file_path, st.st_size, st.st_mtime_ns)
+            if key in self._keyframe_cache:
+                return self._keyframe_cache[key]
+
             cmd = [
-                'ffprobe', 
-                '-v', 'quiet', 
-                '-show_entries', 'format=duration', 
-                '-of', 'default=noprint_wrappers=1:nokey=1', 
+                'ffprobe',
+                '-v', 'error',
+                '-select_streams', 'v:0',
+                '-show_entries', 'packet=pts_time,pos,flags',
+                '-of', 'csv=print_section=0',
                 file_path
             ]
 
-            process = await asyncio.create_subprocess_exec(
-                *cmd,
+            # Reads the whole file, so it shares the cap with ffmpeg runs
+            process = await self._spawn(
+                cmd,
                 stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
+                stderr=asyncio.subprocess.DEVNULL
             )
 
-            stdout, stderr = await process.communicate()
+            # One line per packet, so parse as it streams rather than buffering
+            keyframes = []
 
-            if process.returncode == 0:
-                return float(stdout.decode().strip())
-            else:
-                logger.warning("Could not get video duration, using default")
-                return 3600.0  # Default 1 hour
+            async def read_index() -> None:
+                async for line in process.stdout:
+                    fields = line.decode(errors='replace').strip().split(',')
+                    if len(fields) < 3 or 'K' not in fields[2]:
+                        continue
+                    try:
+                        keyframes.append((float(fields[0]), int(fields[1])))
+                    except ValueError:
+                        continue  # N/A timestamp or position
+                await process.wait()
+
+            try:
+                await asyncio.wait_for(read_index(), timeout=KEYFRAME_PROBE_TIMEOUT)
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+                logger.warning(f"Keyframe index scan timed out after {KEYFRAME_PROBE_TIMEOUT}s")
+                return []
+
+            if process.returncode != 0:
+                logger.warning("Could not read keyframe index")
+                return []
+
+            # ffmpeg shifts output timestamps to start at zero
+            info = await self._probe(file_path, 'format=start_time')
+            try:
+                start_time = float(info['format']['start_time'])
+            except (TypeError, KeyError, ValueError):
+                start_time = 0.0
+            keyframes = [(pts - start_time, pos) for pts, pos in keyframes]
+
+            self._keyframe_cache[key] = keyframes
+            return keyframes
 
         except Exception as e:
-            logger.warning(f"Error getting video duration: {e}")
-            return 3600.0  # Default 1 hour
+            logger.warning(f"Error reading keyframe index: {e}")
+            return []
+
+    async def _probe(self, file_path: str, entries: str) -> Optional[dict]:
+        """
+        Run a bounded ffprobe query and parse its JSON output.
+
+        Args:
+            file_path: Path to video file
+            entries: Value for ``-show_entries`` (e.g. ``format=duration``)
+
+        Returns:
+            Parsed ffprobe output, or None if ffprobe failed
+
+        Raises:
+            asyncio.TimeoutError: If ffprobe doesn't answer in time
+        """
+        cmd = [
+            'ffprobe',
+            '-v', 'error',
+            '-analyzeduration', '100000',
+            '-probesize', '200000',
+            '-show_entries', entries,
+            '-of', 'json',
+            file_path
+        ]
+
+        process = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL
+        )
+
+        # The answer is a few dozen bytes; read just stdout, bounded in time
+        try:
+            stdout = await asyncio.wait_for(process.stdout.read(), timeout=5.0)
+            await asyncio.wait_for(process.wait(), timeout=5.0)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            raise
+
+        if process.returncode != 0:
+            return None
+        return json.loads(stdout)